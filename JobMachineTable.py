@@ -10,15 +10,77 @@
 @copyright	Copyright 2021, Technoface K.K.
 @created date	2021-11-12
 """
+import sys
+from bisect import bisect_right
+
+class MachineCalendar :
+	""" 機械の非稼働時間帯（シフト外、保守、休日など）を格納するクラス """
+	def __init__ ( self, blocked ) :
+		"""
+		@param	blocked	非稼働時間帯 [ [start, end], ... ] のリスト。順不同、重なりがあってもよい
+		"""
+		# startの昇順に並べ、重なりや接する時間帯をまとめてstart, endの配列に分けて格納
+		self._starts, self._ends = [], []
+		for st, ed in sorted ( blocked ) :
+			if ed <= st : continue
+			if self._ends and st <= self._ends [ -1 ] :
+				self._ends [ -1 ] = max ( self._ends [ -1 ], ed )
+			else :
+				self._starts.append ( st )
+				self._ends.append ( ed )
+		# 末尾にダミーの非稼働時間帯をセットしておく
+		self._starts.append ( sys.maxsize )
+		self._ends.append ( sys.maxsize )
+		# gaps [ idx ] = idx番の非稼働時間帯の後に続く稼働時間の長さ
+		gaps = [ st1 - ed0 for ed0, st1 in zip ( self._ends [ :-1 ], self._starts [ 1: ] ) ] + [ sys.maxsize ]
+		# 2**k個ずつの稼働時間の最大値の配列を大きい区間から順に並べる
+		# _maxGaps [ -1-k ][ idx ] = max ( gaps [ idx : idx + 2**k ] )。末尾を越える分は末尾のダミーを含むのでmaxsize
+		self._maxGaps = [ gaps ]
+		while ( 1 << len ( self._maxGaps ) ) <= len ( gaps ) :
+			prev = self._maxGaps [ -1 ]
+			half = 1 << ( len ( self._maxGaps ) - 1 )
+			self._maxGaps.append ( [ max ( prev [ idx ], prev [ idx + half ] ) for idx in range ( len ( prev ) - half ) ]
+								+ [ sys.maxsize ] * half )
+		self._maxGaps.reverse()
+
+	def getEarliestStart ( self, start, process_time ) :
+		""" start以降でprocess_timeの間、非稼働時間帯にかからない最も早い開始時刻を取得 """
+		# startより後に終わる最初の非稼働時間帯
+		idx = bisect_right ( self._ends, start )
+		# 非稼働時間帯にかからなければそのまま開始できる
+		if start + process_time <= self._starts [ idx ] : return start
+		# 次の稼働時間に入るならその開始時刻
+		maxGaps = self._maxGaps
+		if process_time <= maxGaps [ -1 ][ idx ] : return self._ends [ idx ]
+		# idx番以降で後に続く稼働時間がprocess_time以上ある最初の非稼働時間帯を探す
+		# 大きい区間から順に、区間内のすべての稼働時間が足りなければ読み飛ばす
+		k = len ( maxGaps ) - 1
+		for level in maxGaps :
+			if level [ idx ] < process_time :
+				idx += 1 << k
+			k -= 1
+		return self._ends [ idx ]
+
+	def getBlocked ( self ) :
+		""" まとめた非稼働時間帯 [ [start, end], ... ] を取得 """
+		return [ [ st, ed ] for st, ed in zip ( self._starts [ :-1 ], self._ends [ :-1 ] ) ]
+
 class JobMachineTableBase :
 	""" Job x Machine データを格納する基底クラス """
 	def __init__ ( self ) :
 		self._mTable, self._ptTable = self._initTables()
+		self._calendars = [ None ] * self.getMachinesCount()
+		for machine, blocked in enumerate ( self._initCalendars() or [] ) :
+			self.setCalendar ( machine, blocked )
 
 	def _initTables ( self ) :
 		"""問題ごとに派生クラスでオーバーライドする"""
 		return None, None
 
+	def _initCalendars ( self ) :
+		"""非稼働時間帯がある問題は派生クラスでオーバーライドし、機械番号順の非稼働時間帯のリストを返す"""
+		return None
+
 	def _convertJMTable ( self, jmTable ) :
 		# 機械番号をゼロ開始に変更しつつ機械番号用のテーブルと加工時間用のテーブルに分けて格納
 		mTable, ptTable = [], []
@@ -47,6 +109,14 @@ class JobMachineTableBase :
 		""" job_numジョブのprocess_index工程の処理時間を取得 """
 		return self._ptTable [ job_num ][ process_index ]
 
+	def setCalendar ( self, machine, blocked ) :
+		""" machine番の機械の非稼働時間帯 [ [start, end], ... ] を設定。空ならカレンダーなし """
+		self._calendars [ machine ] = MachineCalendar ( blocked ) if blocked else None
+
+	def getCalendars ( self ) :
+		""" 機械番号順のMachineCalendarのリストを取得。カレンダーのない機械はNone """
+		return self._calendars
+
 	def getChild ( self ) :
 		return JobMachineChild ( self )
 
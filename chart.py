@@ -0,0 +1,121 @@
+# coding: utf-8
+"""
+@title	A Python DEAP implementation of Genetic Algorithms with Cluster Averaging Method for Solving Job-Shop Scheduling Problems
+@see	https://www.jstage.jst.go.jp/article/jjsai/10/5/10_769/_article/-char/ja/
+@see	https://www.personal-media.co.jp/book/comp/173/
+@author	Shigeta Yosuke
+@email	shigeta@technoface.co.jp
+@company	Technoface K.K.
+@license	Apache 2.0
+@copyright	Copyright 2021, Technoface K.K.
+@created date	2021-11-12
+
+ガントチャートの出力
+gantt [ MACHINE NUMBER ] = [ [start, end, job_num], ... ] (schedule.getGanttの戻り値)を
+時間軸を縮尺したテキスト、ランレングスのテキスト、CSV、JSON、SVGで出力する。
+いずれも作業数と出力幅に比例する時間で済み、時間軸の長さには依存しない。
+"""
+import csv, json, string
+from xml.sax.saxutils import escape
+
+# テキスト出力でのジョブ番号の表示文字。足りなければ '#'（ジョブ数が多い場合はtoRunLengthStrAryを使う）
+JOB_CHARS = string.digits + string.ascii_uppercase + string.ascii_lowercase
+
+def getMakespan ( gantt ) :
+	""" 最後の作業終了時刻を取得 """
+	return max ( ( row [ -1 ][ 1 ] for row in gantt if row ), default=0 )
+
+def getScale ( gantt, width ) :
+	""" 1文字あたりの時間。メイクスパンがwidth文字に収まるなら1 """
+	return max ( 1, -( -getMakespan ( gantt ) // width ) )
+
+def toScaledStrAry ( gantt, width=200, emp=' ' ) :
+	"""
+	1文字をgetScale単位時間として各機械の行の文字列を取得
+	各文字にはその時間帯の開始時刻に処理しているジョブを表示する
+	1文字に満たない作業はその時間帯が空いていれば表示する
+	@param	width	最大文字数
+	"""
+	scale = getScale ( gantt, width )
+	strAry = []
+	for row_num, row in enumerate ( gantt ) :
+		cells = [ emp ] * ( -( -row [ -1 ][ 1 ] // scale ) if row else 0 )
+		for st, ed, job in row :
+			ch = JOB_CHARS [ job ] if job < len ( JOB_CHARS ) else '#'
+			cell_st, cell_ed = -( -st // scale ), -( -ed // scale )
+			if cell_st < cell_ed :
+				cells [ cell_st : cell_ed ] = ch * ( cell_ed - cell_st )
+			elif st // scale < len ( cells ) and cells [ st // scale ] == emp :
+				cells [ st // scale ] = ch
+		strAry.append ( 'M%2d:' % row_num + ''.join ( cells ) )
+	return strAry
+
+def toRunLengthStrAry ( gantt ) :
+	""" 各機械の行を 'start-end:job' の並びの文字列で取得 """
+	return [ 'M%2d: ' % row_num + ' '.join ( '%d-%d:%d' % ( st, ed, job ) for st, ed, job in row )
+			for row_num, row in enumerate ( gantt ) ]
+
+def writeText ( gantt, f ) :
+	""" ランレングスのテキストを書き出す """
+	for line in toRunLengthStrAry ( gantt ) :
+		f.write ( line + '\n' )
+
+def writeCsv ( gantt, f ) :
+	""" 1作業1行のCSVを書き出す """
+	writer = csv.writer ( f )
+	writer.writerow ( ( 'machine', 'job', 'start', 'end' ) )
+	for machine, row in enumerate ( gantt ) :
+		writer.writerows ( ( machine, job, st, ed ) for st, ed, job in row )
+
+def writeJson ( gantt, f ) :
+	""" {"makespan": ..., "machines": [ [ {"job", "start", "end"}, ... ], ... ]} を機械ごとに書き出す """
+	f.write ( '{"makespan": %d, "machines": [' % getMakespan ( gantt ) )
+	for machine, row in enumerate ( gantt ) :
+		if machine : f.write ( ',' )
+		f.write ( '\n' + json.dumps ( [ { 'job': job, 'start': st, 'end': ed } for st, ed, job in row ] ) )
+	f.write ( '\n]}\n' )
+
+def writeSvg ( gantt, f, width=1000, row_height=20 ) :
+	"""
+	時間軸をwidthピクセルに縮尺したSVGを書き出す
+	@param	width	時間軸の幅（ピクセル）
+	@param	row_height	機械1台分の高さ（ピクセル）
+	"""
+	LABEL = 40
+	makespan = max ( getMakespan ( gantt ), 1 )
+	f.write ( '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" font-family="monospace" font-size="%d">\n'
+			% ( LABEL + width, row_height * len ( gantt ), row_height * 0.6 ) )
+	for machine, row in enumerate ( gantt ) :
+		y = machine * row_height
+		f.write ( '<text x="0" y="%d">M%d</text>\n' % ( y + row_height * 0.75, machine ) )
+		for st, ed, job in row :
+			x, w = LABEL + st * width / makespan, ( ed - st ) * width / makespan
+			# ジョブごとに色相を変える
+			f.write ( '<rect x="%.2f" y="%d" width="%.2f" height="%d" fill="hsl(%d,60%%,60%%)" stroke="white" stroke-width="0.5">'
+					'<title>%s</title></rect>\n'
+					% ( x, y, w, row_height, job * 137.508 % 360, escape ( 'job %d: %d-%d' % ( job, st, ed ) ) ) )
+	f.write ( '</svg>\n' )
+
+# 出力形式ごとの書き出し関数
+WRITERS = {
+	'txt': writeText,
+	'csv': writeCsv,
+	'json': writeJson,
+	'svg': writeSvg,
+}
+
+def export ( gantt, path_base, formats ) :
+	"""
+	formatsの各形式でpath_base.<format>に書き出す
+	@return	書き出したファイル名のリスト
+	"""
+	fnames = []
+	for fmt in formats :
+		fname = '%s.%s' % ( path_base, fmt )
+		with open ( fname, 'w', newline='' ) as f :
+			WRITERS [ fmt ] ( gantt, f )
+		fnames.append ( fname )
+	return fnames
+
+if __name__ == "__main__" :
+	pass
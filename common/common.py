@@ -19,6 +19,7 @@ log_dirname = 'logs'
 log_name = "%s_log.log" % time_stamp
 report_name = "%s_report.dat" % time_stamp
 detail_name = "%s_detail.dat" % time_stamp
+gantt_name = "%s_gantt" % time_stamp
 
 if __name__ == "__main__":
 	pass
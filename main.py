@@ -10,21 +10,11 @@
 @copyright	Copyright 2021, Technoface K.K.
 @created date	2021-11-12
 """
-import os, sys, argparse, random, array
+import os, sys, argparse
 from multiprocessing import Pool
 import numpy as np
 
-from deap import base
-from deap import creator
-from deap import tools
-
-import JobMachineTable, schedule
-
-def initIndividual ( job_num, machine_num ) :
-	# 0からmachine_numまでの数がそれぞれjob_numあるリストを作成しシャッフルする
-	src = list ( range ( job_num ) ) * machine_num
-	random.shuffle ( src )
-	return src
+import JobMachineTable, schedule, solver, chart
 
 def getJmTable ( is_test ) :
 	jmTable = None
@@ -45,38 +35,10 @@ def getJmTable ( is_test ) :
 		jmTable = JobMachineTable.MT10_10()
 	return jmTable
 
-def initialize ( is_test, no_cam ) :
+def initialize ( is_test, no_cam, seed_ratio=0.0, seed_rules=solver.SEED_RULES ) :
 	"""job machine Tableをもとに個体、世代の初期設定"""
-	from functools import partial
 	jmTable = getJmTable ( is_test )
-	MAX_JOBS = jmTable.getJobsCount()
-	MAX_MACHINES = jmTable.getMachinesCount()
-	# makespan最小化
-	creator.create ( "FitnessMin", base.Fitness, weights=(-1.0,) )
-	# 個体はジョブ番号のリスト
-	#creator.create ( "Individual", list, fitness=creator.FitnessMin )
-	creator.create ( "Individual", array.array, typecode='b', fitness=creator.FitnessMin ) # 'b' is signed char
-	toolbox = base.Toolbox()
-	# ゼロからMAX_MACHINES未満までがMAX_JOBS回ランダムに並ぶ個体と設定
-	gen_ind = partial ( initIndividual, MAX_JOBS, MAX_MACHINES )
-	toolbox.register ( "individual", tools.initIterate, creator.Individual, gen_ind )
-	# 初期世代を生成する関数を登録、初期世代はIndividualのリストとして設定
-	toolbox.register ( "population", tools.initRepeat, list, toolbox.individual )
-	# 評価関数を登録
-	toolbox.register ( "evaluate", schedule.eval, jmTable )
-	# 交叉関数を登録
-	toolbox.register ( "mate", schedule.crossover )
-	# 突然変異を登録
-	toolbox.register ( "mutate", schedule.mutation )
-	# ルーレット選択を登録
-	toolbox.register ( "select", tools.selRoulette )
-	# 置換操作を登録
-	if no_cam :
-		# 通常の置換操作
-		toolbox.register ( "getArgWorst", schedule.getArgWorst )
-	else :
-		# クラスタ平均法（CAM）による置換操作
-		toolbox.register ( "getArgWorst", schedule.getArgWorstCAM )
+	toolbox = solver.initialize ( jmTable, no_cam, seed_ratio, seed_rules )
 	return toolbox, jmTable
 
 ### report_log, detail_log
@@ -98,8 +60,11 @@ def write_detail_header ( no_cam ) :
 	header = [ 'seed', 'generation', 'best_fit', 'best_gen', 'Min', 'Max', 'Avg', 'Std', ]
 	if no_cam : pass
 	else :
-		# 各クラスターの大きさと最大クラスターと最小クラスターとの差分を記録（40を境に置換処理が変わるため）
-		header += [ 'C%02d' % idx for idx in range ( 10 ) ] + [ 'Cdiff' ]
+		# 各クラスターの大きさと、個体のいる最大クラスターと最小クラスターとの差分を記録（個体数の40%を境に置換処理が変わるため）
+		# クラスターは先頭遺伝子のジョブ番号ごとなのでジョブ数だけある
+		job_num = gJmTable.getJobsCount()
+		width = len ( str ( job_num - 1 ) )
+		header += [ 'C%0*d' % ( max ( width, 2 ), idx ) for idx in range ( job_num ) ] + [ 'Cdiff' ]
 	detail_log.info ( '\t'.join ( header ) )
 
 def write_detail_body ( pop, best_ind, best_gen, seed, cur_gen, no_cam ) :
@@ -110,8 +75,10 @@ def write_detail_body ( pop, best_ind, best_gen, seed, cur_gen, no_cam ) :
 	row = [ seed, cur_gen, best_ind.fitness.values[0], best_gen, fits.min(), fits.max(), fits.mean(), fits.std() ]
 	if no_cam : pass
 	else :
-		clist = schedule.getClusterList ( pop )
-		row += clist + [ max(clist)-min(clist) ]
+		clist = schedule.getClusterList ( pop, gJmTable.getJobsCount() )
+		# CAMと同じく個体のいるクラスターだけで差分を取る
+		szs = [ sz for sz in clist if sz ]
+		row += clist + [ max(szs)-min(szs) ]
 	detail_log.info ( '\t'.join ( [ str(x) for x in row ] ) )
 	return
 
@@ -142,14 +109,29 @@ def sort_report_log() :
 	fname = report_log.handlers[0].baseFilename
 	sort_log ( fname, lambda r: int ( r [ 0 ] ) )
 
-def write_best_of_loop ( best_fits, best_inds ) :
+def write_best_of_loop ( best_fits, best_inds, gantt_width, gantt_formats ) :
 	""" 全ループでのベスト個体を記録する """
 	from logger import root_log
+	from logger.settings import log_dir
+	from common.common import gantt_name
 	bf = np.array ( best_fits )
 	root_log.info ( "Min:%s Max:%s Avg:%s Std:%s" % ( bf.min(),bf.max(),bf.mean(),bf.std() ) )
 	best_ind = best_inds [ np.argmin ( bf ) ]
 	root_log.info ( "Best individual: %s" % best_ind.tolist() )
-	root_log.info ( "\n"+"\n".join ( schedule.toStrAry( schedule.getGantt ( gJmTable, best_ind ), sep='' ) ) )
+	gantt = schedule.getGantt ( gJmTable, best_ind )
+	# ジョブを1文字で表せなければ 'start-end:job' の並びで記録
+	if len ( chart.JOB_CHARS ) < gJmTable.getJobsCount() :
+		root_log.info ( "Gantt chart: %d jobs do not fit in one character each; run-length format" % gJmTable.getJobsCount() )
+		root_log.info ( "\n"+"\n".join ( chart.toRunLengthStrAry ( gantt ) ) )
+	# 時間軸をgantt_width文字に縮尺して記録
+	else :
+		scale = chart.getScale ( gantt, gantt_width )
+		if 1 < scale :
+			root_log.info ( "Gantt chart: 1 char = %d time units" % scale )
+		root_log.info ( "\n"+"\n".join ( chart.toScaledStrAry ( gantt, gantt_width ) ) )
+	# 指定した形式でガントチャートを書き出す
+	for fname in chart.export ( gantt, os.path.join ( log_dir, gantt_name ), gantt_formats ) :
+		root_log.info ( "Gantt chart: %s" % fname )
 
 def write_line_profile ( prof ) :
 	""" line profile結果を記録する """
@@ -160,63 +142,11 @@ def write_line_profile ( prof ) :
 		root_log.info ( '\n' + bs.getvalue() )
 
 ### main process
-def test2 ( population ) :
-	""" populationに遺伝的操作を施す """
-	# 交叉確率、突然変異確率
-	global gToolbox
-	CXPB, MUTPB = 0.8, 0.5
-	# idx1, idx2 をルーレット選択し複製
-	inds = list ( map ( gToolbox.clone, gToolbox.select ( population, 2 ) ) )
-	# 交叉確率の割合で交叉処理を実施
-	if random.random() < CXPB :
-		gToolbox.mate ( inds [ 0 ], inds [ 1 ] )
-		# 操作した個体の適応度を無効にする
-		del inds [ 0 ].fitness.values
-		del inds [ 1 ].fitness.values
-	# 選択した個体それぞれに操作
-	for ind in inds :
-		# 突然変異確率の割合で突然変異処理を実施
-		if random.random() < MUTPB :
-			gToolbox.mutate ( ind )
-			# 操作した個体の適応度を無効にする
-			del ind.fitness.values
-		# 適応度が無効である個体を再評価
-		if not ind.fitness.valid :
-			ind.fitness.values = gToolbox.evaluate ( ind )
-		# 既存の個体と置換
-		worst_idx = gToolbox.getArgWorst ( population, 1 )[ 0 ]
-		population [ worst_idx ] = ind
-	return population
-
-def do_generation ( population ) :
-	# 個体数半分だけ繰り返す、同じ個体を同時あるいは繰り返し選択してもよい
-	for _ in range ( len ( population ) // 2 ) :
-		test2 ( population )
-	return population
-
 def do_loop ( args ) :
 	global gToolbox
 	seed, population_sz, is_test, no_cam = args
-	random.seed ( seed )
-	# 初期世代を取得
-	pop = gToolbox.population ( n=population_sz )
-	# 初期世代の適応度を取得し個体にセット
-	fitnesses = list ( map ( gToolbox.evaluate, pop ) )
-	for ind, fit in zip ( pop, fitnesses ) :
-		ind.fitness.values = fit
-	# 世代ごとの処理準備
 	g_max = 100 if is_test else 3000
-	best_gen = 0 ; best_ind = gToolbox.clone ( tools.selBest ( pop, 1 )[ 0 ] )
-	# detail_logに統計値を保存
-	write_detail_body ( pop, best_ind, best_gen, seed, 0, no_cam )
-	# ゼロ世代目の評価は終わっているので1世代目から始める
-	for g in range ( 1, g_max ) :
-		pop = do_generation ( pop )
-		# このループでの最良個体を保存
-		tbest_ind = tools.selBest ( pop, 1 )[ 0 ]
-		if tbest_ind.fitness.values[0] < best_ind.fitness.values[0] :
-			best_ind = gToolbox.clone ( tbest_ind )
-			best_gen = g
+	for g, pop, best_gen, best_ind in solver.evolve ( gToolbox, seed, population_sz, g_max ) :
 		# detail_logに統計値を保存
 		write_detail_body ( pop, best_ind, best_gen, seed, g, no_cam )
 	# report_logに結果を記録
@@ -224,7 +154,7 @@ def do_loop ( args ) :
 	# finally
 	return best_gen, best_ind.fitness.values[0], best_ind
 
-def test ( seed, population_sz, loop, is_test, no_cam ) :
+def test ( seed, population_sz, loop, is_test, no_cam, gantt_width=200, gantt_formats=() ) :
 	global gJmTable
 	# detail_log, report_logのヘッダ部書き出し
 	write_detail_header ( no_cam )
@@ -238,7 +168,7 @@ def test ( seed, population_sz, loop, is_test, no_cam ) :
 		best_fits.append ( best_fit )
 		best_inds.append ( best_ind )
 	# 全ループでのベスト個体を記録
-	write_best_of_loop ( best_fits, best_inds )
+	write_best_of_loop ( best_fits, best_inds, gantt_width, gantt_formats )
 	# detail_log, report_logをソートする
 	sort_detail_log()
 	sort_report_log()
@@ -247,24 +177,30 @@ def main2 ( args ) :
 	""" main処理その1の続き """
 	# 処理時間を計測しない
 	if args.do_perf == False :
-		test ( args.seed, args.population, args.loop, args.is_test, args.no_cam )
+		test ( args.seed, args.population, args.loop, args.is_test, args.no_cam, args.gantt_width, args.gantt_formats )
 	# 処理時間を計測する
 	else :
 		from line_profiler import LineProfiler
 		prof = LineProfiler()
 		prof.add_function ( test )
-		prof.add_function ( test2 )
+		prof.add_function ( solver.do_step )
 		prof.add_function ( schedule.eval )
 		prof.add_function ( schedule.getGantt )
 		# 計測開始
-		prof.runcall ( test, args.seed, args.population, args.loop, args.is_test, args.no_cam )
+		prof.runcall ( test, args.seed, args.population, args.loop, args.is_test, args.no_cam
+						, args.gantt_width, args.gantt_formats )
 		# 計測結果をログに記録
 		write_line_profile ( prof )
 
 def main ( args ) :
 	""" main処理その1 """
 	global gToolbox, gJmTable
-	gToolbox, gJmTable = initialize ( args.is_test, args.no_cam )
+	# 常駐してソケット経由で求解リクエストを受け付ける
+	if args.daemon :
+		import server
+		server.serve ( args.socket, args.processes, args.no_cam, args.seed_ratio, args.seed_rules )
+		return
+	gToolbox, gJmTable = initialize ( args.is_test, args.no_cam, args.seed_ratio, args.seed_rules )
 	np.set_printoptions ( linewidth=10000 )
 	# multiprocessingしない
 	if args.no_mp :
@@ -281,22 +217,64 @@ def parseArg() :
 	deffloat = u'(default: %(default)f)'
 	defstr = u'(default: %(default)s)'
 
+	def positive ( x ) :
+		""" 1以上の整数 """
+		value = int ( x )
+		if value < 1 :
+			raise argparse.ArgumentTypeError ( 'must be 1 or more: %s' % x )
+		return value
+
+	def ratio ( x ) :
+		""" 0以上1以下の割合 """
+		value = float ( x )
+		if not 0.0 <= value <= 1.0 :
+			raise argparse.ArgumentTypeError ( 'must be between 0 and 1: %s' % x )
+		return value
+
+	def rules ( x ) :
+		""" カンマ区切りの優先規則名をタプルにする """
+		names = tuple ( x.split ( ',' ) )
+		for name in names :
+			if name not in schedule.DISPATCH_RULES :
+				raise argparse.ArgumentTypeError ( 'unknown dispatching rule: %s' % name )
+		return names
+
+	def formats ( x ) :
+		""" カンマ区切りのガントチャート出力形式をタプルにする """
+		names = tuple ( name for name in x.split ( ',' ) if name )
+		for name in names :
+			if name not in chart.WRITERS :
+				raise argparse.ArgumentTypeError ( 'unknown Gantt chart format: %s' % name )
+		return names
+
 	parser = argparse.ArgumentParser ( description='平野の方法でJSPを解きます' )
 	# input data
 	parser.add_argument ( '--seed', default=0, type=int, help='the number of radom seed.' + defint )
 	parser.add_argument ( '--population', default=100, type=int
 			, help='the number of individuals in one population.' + defint )
 	parser.add_argument ( '--loop', default=1, type=int, help='Loop count.' + defint )
+	parser.add_argument ( '--seed_ratio', default=0.0, type=ratio
+			, help='The ratio of initial individuals seeded by dispatching rules. At most population / jobs seeds share a first job, which caps the effective ratio.' + deffloat )
+	parser.add_argument ( '--seed_rules', default=','.join ( solver.SEED_RULES ), type=rules
+			, help='Comma separated dispatching rules for seeding (SPT, MWKR, LRPT).' + defstr )
 	parser.add_argument ( '--processes', default=os.cpu_count(), type=int
 						, help='The number of worker processes.' + defint )
 	# output
 	parser.add_argument ( '--logdir', default='./logs', type=lambda x: os.path.abspath ( x )
 						, help=u'ログ出力ディレクトリ' + defstr )
+	parser.add_argument ( '--gantt_width', default=200, type=positive
+						, help=u'Max characters of the Gantt chart in the log.' + defint )
+	parser.add_argument ( '--gantt_formats', default='', type=formats
+						, help=u'Comma separated Gantt chart file formats (txt, csv, json, svg).' + defstr )
 	# control
 	parser.add_argument('--do_perf', action='store_true', help=U'Do line profile.' )
 	parser.add_argument('--no_mp', action='store_true', help=U'Dont multi processing.' )
 	parser.add_argument('--no_cam', action='store_true', help=U'Dont use CAM..' )
 	parser.add_argument('--is_test', action='store_true', help=U'MT6x6/MT10x10 and 100/3000 generation.' )
+	# daemon
+	parser.add_argument('--daemon', action='store_true', help=U'Run as a solver daemon with a warm worker pool.' )
+	parser.add_argument ( '--socket', default='./jsp-cam.sock', type=lambda x: os.path.abspath ( x )
+						, help=u'Unix socket path for the daemon.' + defstr )
 	return parser.parse_args()
 
 if __name__ == "__main__" :
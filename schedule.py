@@ -13,22 +13,25 @@
 import sys, random
 import array
 import JobMachineTable
-from operator import attrgetter
+from bisect import bisect_right
+from collections import deque
+from operator import attrgetter, itemgetter
 from deap import base
 from copy import copy, deepcopy
 
 def toStrAry ( sc, sep='', emp=' ' ) :
+	""" 1文字1単位時間の文字列を取得。長い時間軸にはchart.toScaledStrAryを使う """
 	strAry = []
 	for row_num, row in enumerate ( sc ) :
-		strM = ( 'M%2d:' + sep ) % row_num
+		parts = [ ( 'M%2d:' + sep ) % row_num ]
 		cur = 0
 		for st, ed, job in row :
 			if cur < st :
-				strM += ( emp + sep ) * ( st - cur )
+				parts.append ( ( emp + sep ) * ( st - cur ) )
 				cur = st
-			strM += ( str ( job ) + sep ) * ( ed - st )
+			parts.append ( ( str ( job ) + sep ) * ( ed - st ) )
 			cur = ed
-		strAry.append ( strM )
+		strAry.append ( ''.join ( parts ) )
 	return strAry
 
 def getGantt ( jmTable, individual ) :
@@ -40,8 +43,9 @@ def getGantt ( jmTable, individual ) :
 	MAX_MACHINES = jmTable.getMachinesCount()
 	# gantt [ MACHINE NUMBER ] = [ [0,0,None], [start, end, job_num], ...]
 	# startの昇順に並ぶ、初期値にダミーの作業をセットしておく
-	# 非稼働日があるならここでセットする
 	gantt = [ [[0, 0, None], [sys.maxsize, sys.maxsize, None]] for _ in range ( MAX_MACHINES ) ]
+	# 非稼働時間帯は機械ごとのMachineCalendarで隙間の中の開始時刻を調べる
+	calendars = jmTable.getCalendars()
 	jmChild = jmTable.getChild()
 	for job_num in individual :
 		# job_numジョブのこの工程の(Machine番号, 処理時間)を取得
@@ -51,18 +55,23 @@ def getGantt ( jmTable, individual ) :
 		job_earliest = jmChild.getEarliest ( job_num )
 		#print ( job_num, machine, process_time )
 		# 左シフトで挿入できる隙間をさがす
-		for idx, ( ( st0, ed0, _ ), ( st1, ed1, _ ) ) \
-			in enumerate ( zip ( gantt [ machine ][:-1], gantt [ machine ][1:] ) ) :
-			gap_st, gap_ed = ed0, st1
+		row = gantt [ machine ]
+		# 開始時刻が最早時刻以下の最後の作業より前の隙間は、隙間終了時刻が最早時刻に満たないので調べない
+		for idx in range ( bisect_right ( row, job_earliest, key=itemgetter ( 0 ) ) - 1, len ( row ) - 1 ) :
+			gap_st, gap_ed = row [ idx ][ 1 ], row [ idx + 1 ][ 0 ]
+			ed0 = gap_st
 			# 隙間終了時刻でも最早時刻に満たない スキップ
 			if gap_ed <= job_earliest : continue
 			# 最早時刻が隙間の途中にあるとき 隙間の開始時刻を最早時刻にする
 			gap_st = job_earliest if gap_st < job_earliest else ed0
+			# 非稼働時間帯にかからない開始時刻まで後ろにずらす
+			if calendars [ machine ] is not None :
+				gap_st = calendars [ machine ].getEarliestStart ( gap_st, process_time )
 			# 隙間にこの処理が入らない スキップ
 			if ( gap_ed - gap_st ) < process_time : continue
 			# 隙間にこの処理が入る; スケジュールにこの工程を挿入
 			job_end = gap_st + process_time
-			gantt [ machine ].insert ( idx + 1, [ gap_st, job_end, job_num ] )
+			row.insert ( idx + 1, [ gap_st, job_end, job_num ] )
 			break
 
 		jmChild.setNextEarliest ( job_num, job_end )
@@ -70,6 +79,65 @@ def getGantt ( jmTable, individual ) :
 	gantt = [ row[1:-1] for row in gantt ]
 	return gantt
 
+# 優先規則 ( 工程の処理時間, その工程を含む残り作業時間, その工程を除く残り作業時間 ) -> 小さいほど優先
+DISPATCH_RULES = {
+	# Shortest Processing Time: 処理時間が短い工程を優先
+	'SPT': lambda pt, rem, rem_next: pt,
+	# Most WorK Remaining: この工程より後の残り作業時間が長いジョブを優先
+	'MWKR': lambda pt, rem, rem_next: -rem_next,
+	# Longest Remaining Processing Time: この工程を含む残り作業時間が長いジョブを優先
+	'LRPT': lambda pt, rem, rem_next: -rem,
+}
+
+# 優先規則で生成する個体に多様性を持たせるため、優先度に掛ける乱数の幅
+DISPATCH_NOISE = 0.2
+
+def getDispatchIndividual ( jmTable, rule, rng=random ) :
+	"""
+	優先規則によるGiffler&Thompson法でアクティブスケジュールを作り、工程順のジョブ番号リストを取得する
+	同じ優先度の工程はランダムに選ぶ
+	@param	jmTable	job x machine num, process time table
+	@param	rule	DISPATCH_RULESのキー
+	@param	rng	乱数生成器（random.Randomまたはrandomモジュール）
+	"""
+	priority = DISPATCH_RULES [ rule ]
+	MAX_JOBS = jmTable.getJobsCount()
+	MAX_MACHINES = jmTable.getMachinesCount()
+	# remains [ job_num ][ process_index ] = process_index工程以降の処理時間の合計
+	remains = []
+	for job_num in range ( MAX_JOBS ) :
+		rem = [ 0 ] * ( MAX_MACHINES + 1 )
+		for process_index in reversed ( range ( MAX_MACHINES ) ) :
+			rem [ process_index ] = rem [ process_index + 1 ] + jmTable.getProcessTime ( job_num, process_index )
+		remains.append ( rem )
+	next_indexes = [ 0 ] * MAX_JOBS
+	job_ready = [ 0 ] * MAX_JOBS
+	machine_ready = [ 0 ] * MAX_MACHINES
+	individual = []
+	for _ in range ( MAX_JOBS * MAX_MACHINES ) :
+		# 未完了ジョブの次工程 ( 開始可能時刻, 終了時刻, 機械番号, ジョブ番号 )
+		cands = []
+		for job_num in range ( MAX_JOBS ) :
+			process_index = next_indexes [ job_num ]
+			if process_index == MAX_MACHINES : continue
+			machine = jmTable.getMachine ( job_num, process_index )
+			st = max ( job_ready [ job_num ], machine_ready [ machine ] )
+			cands.append ( ( st, st + jmTable.getProcessTime ( job_num, process_index ), machine, job_num ) )
+		# 最も早く終了する工程の機械で、その終了時刻より前に開始できる工程が競合集合
+		_, c_star, m_star, _ = min ( cands, key=lambda c: c [ 1 ] )
+		conflicts = [ c for c in cands if c [ 2 ] == m_star and c [ 0 ] < c_star ]
+		# 競合集合から優先規則で1つ選ぶ
+		def key ( c ) :
+			st, ed, _, j = c ; k = next_indexes [ j ]
+			# 優先度に DISPATCH_NOISE の割合の乱数を掛けて近い優先度の工程の順番を入れ替える
+			noise = 1.0 + DISPATCH_NOISE * ( 2.0 * rng.random() - 1.0 )
+			return priority ( ed - st, remains [ j ][ k ], remains [ j ][ k + 1 ] ) * noise, rng.random()
+		_, job_end, _, job_num = min ( conflicts, key=key )
+		job_ready [ job_num ] = machine_ready [ m_star ] = job_end
+		next_indexes [ job_num ] += 1
+		individual.append ( job_num )
+	return individual
+
 def eval ( jmTable, individual ) :
 	""" individualの適応度を取得する """
 	# individualからガントチャートを取得する
@@ -81,14 +149,14 @@ def eval ( jmTable, individual ) :
 		makespan = max ( makespan, row [ -1 ][ 1 ] )
 	return makespan,
 
-def crossover ( ind1, ind2 ) :
+def crossover ( ind1, ind2, rng=random ) :
 	"""JSP用の2点交叉処理"""
 	# ind1, ind2の長さは同じ
 	size = len ( ind1 )
 	cxpoint1, cxpoint2 = 0, 0
 	while cxpoint1 == cxpoint2 :
-		cxpoint1 = random.randrange ( 0, size )
-		cxpoint2 = random.randrange ( 0, size )
+		cxpoint1 = rng.randrange ( 0, size )
+		cxpoint2 = rng.randrange ( 0, size )
 	# 2点目が1点目より前なら入れ替える
 	if cxpoint2 < cxpoint1 :
 		cxpoint1, cxpoint2 = cxpoint2, cxpoint1
@@ -97,42 +165,62 @@ def crossover ( ind1, ind2 ) :
 	sub2 = array.array ( ind2.typecode, ind2 [ cxpoint1 : cxpoint2 ] )
 	new_sub1 = array.array ( ind1.typecode, [ -1 ] * ( cxpoint2 - cxpoint1 ) )
 	new_sub2 = array.array ( ind2.typecode, [ -1 ] * ( cxpoint2 - cxpoint1 ) )
+	# ind2の部分遺伝子の要素ごとの未コピー位置（前から順に使う）
+	s2_indexes = {}
+	for s2_idx, s2 in enumerate ( sub2 ) :
+		s2_indexes.setdefault ( s2, deque() ).append ( s2_idx )
 	for s1_idx, s1 in enumerate ( ind1 [ cxpoint1 : cxpoint2 ] ) :
 		# ind1の部分遺伝子の要素がind2の部分遺伝子にみつからない
-		if s1 not in sub2 : continue
+		if not s2_indexes.get ( s1 ) : continue
 		# みつかったら相手のnew_subに位置を保存してコピー
-		s2_idx = sub2.index ( s1 )
+		s2_idx = s2_indexes [ s1 ].popleft()
 		new_sub1 [ s2_idx ] = s1
 		new_sub2 [ s1_idx ] = s1
 		# コピーした要素は-1にしておく
 		sub1 [ s1_idx ] = -1
 		sub2 [ s2_idx ] = -1
-	# コピーしなかった要素を順序を保存して戻す
-	for s1 in sub1 :
+	# コピーしなかった要素を順序を保存して、new_subの未コピー位置に前から戻す
+	for new_sub, sub in ( ( new_sub1, sub1 ), ( new_sub2, sub2 ) ) :
 		# -1の場合コピー済み
-		if s1 == -1 : continue
-		# new_sub1の未コピー位置を取得
-		idx = new_sub1.index ( -1 )
-		new_sub1 [ idx ] = s1
-	for s2 in sub2 :
-		if s2 == -1 : continue
-		idx = new_sub2.index ( -1 )
-		new_sub2 [ idx ] = s2
+		rest = ( s for s in sub if s != -1 )
+		for idx, s in enumerate ( new_sub ) :
+			if s == -1 :
+				new_sub [ idx ] = next ( rest )
 	# 部分遺伝子を個体にセット
 	ind1 [ cxpoint1 : cxpoint2 ] = new_sub1
 	ind2 [ cxpoint1 : cxpoint2 ] = new_sub2
 	return ind1, ind2
 
-def mutation ( ind ) :
+def mutation ( ind, rng=random ) :
 	"""JSP用の突然変異処理"""
 	size = len ( ind )
 	# 理由は不明だがオリジナルソースでは2回実施している
 	for _ in range ( 2 ) :
-		pos1 = random.randrange ( 0, size )
-		pos2 = random.randrange ( 0, size )
+		pos1 = rng.randrange ( 0, size )
+		pos2 = rng.randrange ( 0, size )
 		ind [ pos1 ], ind [ pos2 ] = ind [ pos2 ], ind [ pos1 ]
 	return ind
 
+def selRoulette ( individuals, k, rng=random ) :
+	"""
+	ルーレット選択。deap.tools.selRouletteと同じ処理で乱数生成器を指定できる
+	@param	individuals	individualのリスト
+	@param	k	選択する個体数
+	@param	rng	乱数生成器（random.Randomまたはrandomモジュール）
+	"""
+	s_inds = sorted ( individuals, key=attrgetter ( 'fitness' ), reverse=True )
+	sum_fits = sum ( ind.fitness.values[0] for ind in individuals )
+	chosen = []
+	for _ in range ( k ) :
+		u = rng.random() * sum_fits
+		sum_ = 0
+		for ind in s_inds :
+			sum_ += ind.fitness.values[0]
+			if sum_ > u :
+				chosen.append ( ind )
+				break
+	return chosen
+
 def getWorst ( population, n ) :
 	"""
 	fitnessesの大きい方からn個の個体を取得
@@ -164,13 +252,20 @@ def getClusters ( population ) :
 		clusters [ ind [ 0 ] ].append ( ind )
 	return clusters
 
-def getClusterList ( population, n=10 ) :
+def getClusterList ( population, n ) :
+	"""
+	先頭遺伝子（ジョブ番号）別のクラスターの大きさのリストを取得
+	@param	n	クラスター数（ジョブ数）
+	"""
 	cluster = getClusters ( population )
 	cl = [ 0 ] * n
 	for k, v in cluster.items() :
 		cl [ k ] = len ( v )
 	return cl
 
+# CAMで最大クラスターから置換する個体を探す、最大と最小のクラスターの個体数の差の個体数に対する割合
+CAM_RATIO = 0.4
+
 def getArgWorstCAM ( population, n ) :
 	"""クラスタ平均化法(Cluster Averaging Method)により適応度が悪い個体をn個選択
 	@param	population	numpy.array	個体リスト。順序は適応度の小さい順に変わる
@@ -184,7 +279,8 @@ def getArgWorstCAM ( population, n ) :
 	max_cluster_sz = len ( max_cluster )
 	min_cluster_sz = len ( min ( clusters.values(), key=len ) )
 	# 最大のクラスターと最小のクラスターと個体数の差が小さければ全体から探す
-	if ( max_cluster_sz - min_cluster_sz  ) < 40 :
+	# 差の閾値は個体数に比例させる（個体数100のとき40）
+	if ( max_cluster_sz - min_cluster_sz  ) < CAM_RATIO * len ( population ) :
 		selected = getArgWorst ( population, n )
 	# 最大のクラスターと最小のクラスターと個体数の差が大きければ最大クラスターから探す
 	else :
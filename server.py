@@ -0,0 +1,216 @@
+# coding: utf-8
+"""
+@title	A Python DEAP implementation of Genetic Algorithms with Cluster Averaging Method for Solving Job-Shop Scheduling Problems
+@see	https://www.jstage.jst.go.jp/article/jjsai/10/5/10_769/_article/-char/ja/
+@see	https://www.personal-media.co.jp/book/comp/173/
+@author	Shigeta Yosuke
+@email	shigeta@technoface.co.jp
+@company	Technoface K.K.
+@license	Apache 2.0
+@copyright	Copyright 2021, Technoface K.K.
+@created date	2021-11-12
+
+常駐型の求解サーバー
+起動時に問題の読み込み、toolboxの生成、ワーカープロセスのforkを済ませておき、
+Unixソケットで受け付けたリクエストごとに求解時間だけで応答する。
+
+リクエスト（1行1JSON）
+	{"instance": "MT6_6", "seed": 0, "population": 100, "generations": 100, "time_limit": 1.5}
+レスポンス（1行1JSON、最良個体が更新されるたびに送る）
+	{"generation": 3, "makespan": 58.0, "individual": [...]}
+	{"done": true, "generation": 99, "best_gen": 42, "makespan": 55.0, "individual": [...]}
+"""
+import os, json, itertools, threading, queue, select, signal, socket, socketserver
+from contextlib import closing
+from multiprocessing import Pool, Queue, Manager
+
+import JobMachineTable, solver
+
+# 起動時に読み込んでおく問題
+INSTANCES = ( 'EX3_4', 'MT6_6', 'MT10_10' )
+
+# 問題名ごとのtoolbox（forkの前に生成しワーカープロセスに引き継ぐ）
+gToolboxes = {}
+# ワーカープロセスからサーバープロセスへ結果を送るキュー
+gResultQueue = None
+# 結果を待つ間にクライアントの切断を調べる間隔（秒）
+HEARTBEAT = 1.0
+
+### worker process
+def init_worker ( result_queue ) :
+	""" ワーカープロセスの初期化 """
+	global gResultQueue
+	gResultQueue = result_queue
+
+def put_best ( req_id, generation, best_ind ) :
+	""" 最良個体をサーバープロセスへ送る """
+	gResultQueue.put ( ( req_id, {
+		'generation': generation,
+		'makespan': best_ind.fitness.values[0],
+		'individual': best_ind.tolist(),
+	} ) )
+
+def solve ( args ) :
+	""" ワーカープロセスで1リクエスト分のGAを実行する """
+	req_id, cancel, instance, seed, population_sz, g_max, time_limit = args
+	try :
+		g, best_gen, best_ind = 0, 0, None
+		for g, _, best_gen, best_ind in solver.evolve ( gToolboxes [ instance ], seed, population_sz, g_max, time_limit, cancel ) :
+			if best_gen == g :
+				put_best ( req_id, best_gen, best_ind )
+		gResultQueue.put ( ( req_id, {
+			'done': True,
+			'generation': g,
+			'best_gen': best_gen,
+			'makespan': best_ind.fitness.values[0],
+			'individual': best_ind.tolist(),
+		} ) )
+	except Exception as e :
+		gResultQueue.put ( ( req_id, { 'done': True, 'error': repr ( e ) } ) )
+
+### server process
+class Solver :
+	""" ワーカープールへリクエストを振り分け、結果をリクエストごとに返す """
+	def __init__ ( self, pool, result_queue, manager ) :
+		self._pool = pool
+		self._manager = manager
+		self._result_queue = result_queue
+		self._req_ids = itertools.count()
+		self._lock = threading.Lock()
+		# req_id -> queue.Queue
+		self._pending = {}
+		self._dispatcher = threading.Thread ( target=self._dispatch, daemon=True )
+		self._dispatcher.start()
+
+	def _dispatch ( self ) :
+		""" ワーカーからの結果をリクエストごとのキューに振り分ける """
+		while True :
+			req_id, msg = self._result_queue.get()
+			with self._lock :
+				q = self._pending.get ( req_id )
+			if q is not None :
+				q.put ( msg )
+
+	def parse ( self, request ) :
+		""" リクエストを検証しsolveの引数に変換する """
+		if not isinstance ( request, dict ) :
+			raise ValueError ( 'request must be a JSON object' )
+		instance = request.get ( 'instance', 'MT10_10' )
+		if instance not in gToolboxes :
+			raise ValueError ( 'unknown instance: %s' % instance )
+		seed = int ( request.get ( 'seed', 0 ) )
+		population_sz = int ( request.get ( 'population', 100 ) )
+		if population_sz < 2 :
+			raise ValueError ( 'population must be 2 or more' )
+		g_max = int ( request.get ( 'generations', 3000 ) )
+		time_limit = request.get ( 'time_limit' )
+		if time_limit is not None :
+			time_limit = float ( time_limit )
+		return instance, seed, population_sz, g_max, time_limit
+
+	def submit ( self, request ) :
+		"""
+		リクエストを実行し、結果を順次返すジェネレーター
+		HEARTBEAT秒ごとに結果がなければNoneを返す。doneの前に閉じられたらワーカーの処理を打ち切る
+		"""
+		args = self.parse ( request )
+		req_id = next ( self._req_ids )
+		q = queue.Queue()
+		# ワーカーから見える打ち切りフラグ
+		cancel = self._manager.Event()
+		with self._lock :
+			self._pending [ req_id ] = q
+		done = False
+		try :
+			self._pool.apply_async ( solve, ( ( req_id, cancel ) + args, ) )
+			while not done :
+				try :
+					msg = q.get ( timeout=HEARTBEAT )
+				except queue.Empty :
+					msg = None
+				else :
+					done = msg.get ( 'done', False )
+				yield msg
+		finally :
+			if not done :
+				cancel.set()
+			with self._lock :
+				del self._pending [ req_id ]
+
+class RequestHandler ( socketserver.StreamRequestHandler ) :
+	""" 1行1JSONのリクエストを受け付け、結果を1行1JSONで返す """
+	def handle ( self ) :
+		from logger import root_log
+		for line in self.rfile :
+			if not line.strip() : continue
+			try :
+				request = json.loads ( line )
+				root_log.info ( 'request: %s' % request )
+				with closing ( self.server.solver.submit ( request ) ) as msgs :
+					for msg in msgs :
+						if msg is not None :
+							self.write ( msg )
+						# 結果がない間もクライアントが切断していれば打ち切る（書き込み側だけ閉じたクライアントは待つ）
+						elif self.is_closed() :
+							root_log.info ( 'client disconnected: %s' % request )
+							return
+			except ( ValueError, TypeError ) as e :
+				self.write ( { 'done': True, 'error': str ( e ) } )
+			except BrokenPipeError :
+				return
+
+	def is_closed ( self ) :
+		"""
+		クライアントが切断していればTrue
+		shutdown(SHUT_WR)などで書き込み側だけ閉じた場合もEOFは読めるが結果は受け取れるので、
+		読み込みではなくPOLLHUP/POLLERRで判定する
+		"""
+		poller = select.poll()
+		poller.register ( self.connection, select.POLLHUP | select.POLLERR )
+		return any ( event & ( select.POLLHUP | select.POLLERR | select.POLLNVAL ) for _, event in poller.poll ( 0 ) )
+
+	def write ( self, msg ) :
+		self.wfile.write ( ( json.dumps ( msg ) + '\n' ).encode ( 'utf-8' ) )
+		self.wfile.flush()
+
+class Server ( socketserver.ThreadingMixIn, socketserver.UnixStreamServer ) :
+	daemon_threads = True
+
+def is_listening ( socket_path ) :
+	""" socket_pathで他のサーバーが待ち受けていればTrue。接続を拒否されたら残っているだけのソケットファイル """
+	with socket.socket ( socket.AF_UNIX, socket.SOCK_STREAM ) as sock :
+		try :
+			sock.connect ( socket_path )
+		except ConnectionRefusedError :
+			return False
+	return True
+
+def serve ( socket_path, processes, no_cam, seed_ratio=0.0, seed_rules=solver.SEED_RULES ) :
+	""" 問題とワーカープールを準備してリクエストを待ち受ける """
+	from logger import root_log
+	# 動いているサーバーのソケットを奪わない
+	if os.path.exists ( socket_path ) :
+		if is_listening ( socket_path ) :
+			root_log.error ( 'Another server is listening on %s' % socket_path )
+			return
+		os.remove ( socket_path )
+	for name in INSTANCES :
+		jmTable = getattr ( JobMachineTable, name )()
+		gToolboxes [ name ] = solver.initialize ( jmTable, no_cam, seed_ratio, seed_rules )
+	result_queue = Queue()
+	# このタイミングでforkする
+	with Manager() as manager, Pool ( processes, initializer=init_worker, initargs=( result_queue, ) ) as pool :
+		with Server ( socket_path, RequestHandler ) as server :
+			server.solver = Solver ( pool, result_queue, manager )
+			# SIGTERMでもCtrl-Cと同様に終了する（fork後に設定しワーカーには影響させない）
+			signal.signal ( signal.SIGTERM, signal.default_int_handler )
+			root_log.info ( 'Listening on %s' % socket_path )
+			try :
+				server.serve_forever()
+			except KeyboardInterrupt :
+				pass
+			finally :
+				os.remove ( socket_path )
+
+if __name__ == "__main__" :
+	pass
@@ -0,0 +1,219 @@
+# coding: utf-8
+"""
+@title	A Python DEAP implementation of Genetic Algorithms with Cluster Averaging Method for Solving Job-Shop Scheduling Problems
+@see	https://www.jstage.jst.go.jp/article/jjsai/10/5/10_769/_article/-char/ja/
+@see	https://www.personal-media.co.jp/book/comp/173/
+@author	Shigeta Yosuke
+@email	shigeta@technoface.co.jp
+@company	Technoface K.K.
+@license	Apache 2.0
+@copyright	Copyright 2021, Technoface K.K.
+@created date	2021-11-12
+
+組み込み用のGAソルバー
+グローバル変数やログ出力を使わず、最良個体が更新されるたびに結果を返す。
+
+	import JobMachineTable, solver
+	for best in solver.solve ( JobMachineTable.MT6_6(), seed=1, g_max=100 ) :
+		print ( best.generation, best.makespan )
+"""
+import time, random, array
+from collections import namedtuple
+
+from deap import base
+from deap import creator
+from deap import tools
+
+import schedule
+
+# 交叉確率、突然変異確率
+CXPB, MUTPB = 0.8, 0.5
+
+# 初期世代の生成に使う優先規則
+SEED_RULES = ( 'SPT', 'MWKR', 'LRPT' )
+
+# 優先規則から生成した個体が続けてこの回数だけ作り直しになったら、その規則は使うのをやめる
+SEED_RETRIES = 10
+
+# 最良個体が更新されたときに返す値
+Best = namedtuple ( 'Best', ( 'makespan', 'generation', 'individual', 'gantt' ) )
+
+def initIndividual ( job_num, machine_num, rng=random ) :
+	# 0からmachine_numまでの数がそれぞれjob_numあるリストを作成しシャッフルする
+	src = list ( range ( job_num ) ) * machine_num
+	rng.shuffle ( src )
+	return src
+
+def createIndividual ( Individual, job_num, machine_num, rng=random ) :
+	""" ランダムな個体を生成する """
+	return Individual ( initIndividual ( job_num, machine_num, rng ) )
+
+def initPopulation ( Individual, jmTable, seed_ratio, seed_rules, individual, n, rng=random ) :
+	"""
+	初期世代を生成する。seed_ratioの割合は優先規則から、残りはランダムに生成する
+	CAMのクラスターの多様性を保つため、優先規則から生成した個体が重複したり、
+	同じクラスター（先頭遺伝子）に平均の個体数より多く入る場合は作り直す。
+	SEED_RETRIES回続けて作り直しになった優先規則は使うのをやめ、足りない分はランダムな個体にする
+	@param	Individual	個体の型
+	@param	seed_ratio	優先規則から生成する個体の割合
+	@param	seed_rules	優先規則名のリスト。順番に使う
+	@param	individual	ランダムな個体を生成する関数
+	@param	n	個体数
+	@param	rng	乱数生成器
+	"""
+	n_seed = int ( round ( n * seed_ratio ) ) if seed_rules else 0
+	cap = max ( 1, n // jmTable.getJobsCount() )
+	seen, cluster_szs, pop = set(), {}, []
+	# 優先規則 -> 続けて作り直しになった回数
+	rules = { rule: 0 for rule in seed_rules }
+	while len ( pop ) < n_seed and rules :
+		for rule in list ( rules ) :
+			if n_seed <= len ( pop ) : break
+			ind = schedule.getDispatchIndividual ( jmTable, rule, rng )
+			if tuple ( ind ) in seen or cap <= cluster_szs.get ( ind [ 0 ], 0 ) :
+				rules [ rule ] += 1
+				if SEED_RETRIES <= rules [ rule ] : del rules [ rule ]
+				continue
+			rules [ rule ] = 0
+			seen.add ( tuple ( ind ) )
+			cluster_szs [ ind [ 0 ] ] = cluster_szs.get ( ind [ 0 ], 0 ) + 1
+			pop.append ( Individual ( ind ) )
+	return pop + [ individual ( rng=rng ) for _ in range ( n - len ( pop ) ) ]
+
+def getTypecode ( job_num ) :
+	""" job_num個のジョブ番号と交叉で使う-1を格納できる最小の符号付き整数のtypecodeを取得 """
+	for typecode in ( 'b', 'h', 'i', 'q' ) :
+		if job_num <= 1 << ( 8 * array.array ( typecode ).itemsize - 1 ) : return typecode
+	raise ValueError ( 'too many jobs: %d' % job_num )
+
+def createTypes ( typecode ) :
+	"""
+	適応度と個体の型を生成する。複数の問題を初期化しても型ごとに一度だけ生成する
+	@return	個体の型 creator.Individual_<typecode>
+	"""
+	name = "Individual_%s" % typecode
+	if not hasattr ( creator, "FitnessMin" ) :
+		# makespan最小化
+		creator.create ( "FitnessMin", base.Fitness, weights=(-1.0,) )
+	if not hasattr ( creator, name ) :
+		# 個体はジョブ番号のリスト。ジョブ数に応じて 'b' signed char, 'h' signed short...
+		creator.create ( name, array.array, typecode=typecode, fitness=creator.FitnessMin )
+	return getattr ( creator, name )
+
+def initialize ( jmTable, no_cam=False, seed_ratio=0.0, seed_rules=SEED_RULES ) :
+	"""job machine Tableをもとに個体、世代の初期設定
+	@param	jmTable	JobMachineTableBase
+	@param	no_cam	Trueなら通常の置換操作、FalseならCAMによる置換操作
+	@param	seed_ratio	初期世代のうち優先規則（schedule.DISPATCH_RULES）から生成する個体の割合
+	@param	seed_rules	初期世代の生成に使う優先規則名のリスト
+	@return	toolbox
+	"""
+	if not 0.0 <= seed_ratio <= 1.0 :
+		raise ValueError ( 'seed_ratio must be between 0 and 1: %s' % seed_ratio )
+	MAX_JOBS = jmTable.getJobsCount()
+	MAX_MACHINES = jmTable.getMachinesCount()
+	Individual = createTypes ( getTypecode ( MAX_JOBS ) )
+	toolbox = base.Toolbox()
+	# 乱数を使う関数は呼び出し時にrng=で乱数生成器を受け取る
+	# ゼロからMAX_MACHINES未満までがMAX_JOBS回ランダムに並ぶ個体と設定
+	toolbox.register ( "individual", createIndividual, Individual, MAX_JOBS, MAX_MACHINES )
+	# 初期世代を生成する関数を登録、初期世代はIndividualのリストとして設定
+	toolbox.register ( "population", initPopulation, Individual, jmTable, seed_ratio, seed_rules, toolbox.individual )
+	# 評価関数を登録
+	toolbox.register ( "evaluate", schedule.eval, jmTable )
+	# ガントチャート取得関数を登録
+	toolbox.register ( "gantt", schedule.getGantt, jmTable )
+	# 交叉関数を登録
+	toolbox.register ( "mate", schedule.crossover )
+	# 突然変異を登録
+	toolbox.register ( "mutate", schedule.mutation )
+	# ルーレット選択を登録
+	toolbox.register ( "select", schedule.selRoulette )
+	# 置換操作を登録
+	if no_cam :
+		# 通常の置換操作
+		toolbox.register ( "getArgWorst", schedule.getArgWorst )
+	else :
+		# クラスタ平均法（CAM）による置換操作
+		toolbox.register ( "getArgWorst", schedule.getArgWorstCAM )
+	return toolbox
+
+def do_step ( toolbox, population, rng=random ) :
+	""" populationに遺伝的操作を施す """
+	# idx1, idx2 をルーレット選択し複製
+	inds = list ( map ( toolbox.clone, toolbox.select ( population, 2, rng=rng ) ) )
+	# 交叉確率の割合で交叉処理を実施
+	if rng.random() < CXPB :
+		toolbox.mate ( inds [ 0 ], inds [ 1 ], rng=rng )
+		# 操作した個体の適応度を無効にする
+		del inds [ 0 ].fitness.values
+		del inds [ 1 ].fitness.values
+	# 選択した個体それぞれに操作
+	for ind in inds :
+		# 突然変異確率の割合で突然変異処理を実施
+		if rng.random() < MUTPB :
+			toolbox.mutate ( ind, rng=rng )
+			# 操作した個体の適応度を無効にする
+			del ind.fitness.values
+		# 適応度が無効である個体を再評価
+		if not ind.fitness.valid :
+			ind.fitness.values = toolbox.evaluate ( ind )
+		# 既存の個体と置換
+		worst_idx = toolbox.getArgWorst ( population, 1 )[ 0 ]
+		population [ worst_idx ] = ind
+	return population
+
+def do_generation ( toolbox, population, rng=random ) :
+	# 個体数半分だけ繰り返す、同じ個体を同時あるいは繰り返し選択してもよい
+	for _ in range ( len ( population ) // 2 ) :
+		do_step ( toolbox, population, rng )
+	return population
+
+def evolve ( toolbox, seed, population_sz, g_max, time_limit=None, cancel=None ) :
+	"""
+	世代ごとに ( 世代番号, 個体群, 最良個体の世代, 最良個体 ) を返すジェネレーター
+	@param	seed	乱数シード。呼び出しごとのrandom.Randomを使い、randomモジュールの状態は変えない
+	@param	g_max	ゼロ世代目を含む最大世代数
+	@param	time_limit	制限時間（秒）。Noneなら制限しない
+	@param	cancel	threading.Eventなど。is_set()がTrueになったら打ち切る
+	"""
+	deadline = None if time_limit is None else time.monotonic() + time_limit
+	rng = random.Random ( seed )
+	# 初期世代を取得
+	pop = toolbox.population ( n=population_sz, rng=rng )
+	# 初期世代の適応度を取得し個体にセット
+	fitnesses = list ( map ( toolbox.evaluate, pop ) )
+	for ind, fit in zip ( pop, fitnesses ) :
+		ind.fitness.values = fit
+	best_gen = 0 ; best_ind = toolbox.clone ( tools.selBest ( pop, 1 )[ 0 ] )
+	yield 0, pop, best_gen, best_ind
+	# ゼロ世代目の評価は終わっているので1世代目から始める
+	for g in range ( 1, g_max ) :
+		if cancel is not None and cancel.is_set() : return
+		if deadline is not None and deadline <= time.monotonic() : return
+		pop = do_generation ( toolbox, pop, rng )
+		# このループでの最良個体を保存
+		tbest_ind = tools.selBest ( pop, 1 )[ 0 ]
+		if tbest_ind.fitness.values[0] < best_ind.fitness.values[0] :
+			best_ind = toolbox.clone ( tbest_ind )
+			best_gen = g
+		yield g, pop, best_gen, best_ind
+
+def do_loop ( toolbox, seed=0, population_sz=100, g_max=3000, time_limit=None, cancel=None ) :
+	""" 最良個体が更新されるたびにBestを返すジェネレーター。引数はevolveと同じ """
+	for g, _, best_gen, best_ind in evolve ( toolbox, seed, population_sz, g_max, time_limit, cancel ) :
+		if best_gen != g : continue
+		yield Best ( best_ind.fitness.values[0], g, best_ind, toolbox.gantt ( best_ind ) )
+
+def solve ( jmTable, seed=0, population_sz=100, g_max=3000, time_limit=None, no_cam=False, cancel=None
+			, seed_ratio=0.0, seed_rules=SEED_RULES ) :
+	"""
+	jmTableを解き、最良個体が更新されるたびにBestを返すジェネレーター
+	呼び出し側はいつでもclose()やbreakで打ち切れる
+	@param	jmTable	JobMachineTableBase
+	"""
+	toolbox = initialize ( jmTable, no_cam, seed_ratio, seed_rules )
+	yield from do_loop ( toolbox, seed, population_sz, g_max, time_limit, cancel )
+
+if __name__ == "__main__" :
+	pass